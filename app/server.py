@@ -1,4 +1,4 @@
-from fastapi import FastAPI, UploadFile, Path, Form
+from fastapi import FastAPI, UploadFile, Path, Form, Query, BackgroundTasks
 from .utils.file import save_to_disc
 from .db.collections.files import files_collection, FileSchema
 from .queue.q import q
@@ -8,10 +8,29 @@ from bson import ObjectId
 app = FastAPI()
 
 
+# Fields clients may request via ?fields=; also the default response shape
+FILE_FIELDS = ("name", "status", "job_description", "enhanced_job_description", "result", "analysis")
+
+
 @app.get('/{id}')
-async def get_file_by_id(id: str = Path(..., description="ID of the file")):
-    db_file = await files_collection.find_one({"_id": ObjectId(id)})
-    
+async def get_file_by_id(
+    id: str = Path(..., description="ID of the file"),
+    fields: str = Query(None, description="Comma-separated subset of fields to return, e.g. 'status,analysis.match_score'")
+):
+    if fields:
+        # Lean status polls: project only the requested fields (dotted
+        # subfields like analysis.match_score are allowed) so the large
+        # analysis and enhanced JD blobs stay off the wire
+        requested = [f.strip() for f in fields.split(',') if f.strip()]
+        projection = {f: 1 for f in requested if f.split('.')[0] in FILE_FIELDS}
+        db_file = await files_collection.find_one({"_id": ObjectId(id)}, projection)
+
+        response = {k: v for k, v in db_file.items() if k != "_id"}
+        response["_id"] = str(db_file["_id"])
+        return response
+
+    db_file = await files_collection.find_one({"_id": ObjectId(id)}, {f: 1 for f in FILE_FIELDS})
+
     return {
         "_id": str(db_file["_id"]),
         "name": db_file["name"],
@@ -28,8 +47,20 @@ def hello():
     return {"status": "healthy"}
 
 
+async def enqueue_for_processing(id: str, file_path: str, job_description: str):
+    # push to queue
+    q.enqueue(process_file, id, file_path=file_path, job_description=job_description)
+
+    # mongo save
+    await files_collection.update_one({"_id": ObjectId(id)}, {
+        "$set": {
+            "status": "queued"
+        }
+    })
+
+
 @app.post("/upload")
-async def upload_file(file: UploadFile, job_description: str = Form(...)):
+async def upload_file(file: UploadFile, background_tasks: BackgroundTasks, job_description: str = Form(...)):
     # entry in mongo
     db_file = await files_collection.insert_one(
         document=FileSchema(
@@ -41,15 +72,8 @@ async def upload_file(file: UploadFile, job_description: str = Form(...)):
 
     # save to disc
     file_path = f"/mnt/uploads/{str(db_file.inserted_id)}/{file.filename}"
-    await save_to_disc(file=await file.read(), path=file_path)
-    
-    # push to queue
-    q.enqueue(process_file, str(db_file.inserted_id), file_path=file_path, job_description=job_description)
+    await save_to_disc(file=file, path=file_path)
 
-    # mongo save
-    await files_collection.update_one({"_id": db_file.inserted_id}, {
-        "$set": {
-            "status": "queued"
-        }
-    })
+    # enqueue after the response is sent; the client only needs the id
+    background_tasks.add_task(enqueue_for_processing, str(db_file.inserted_id), file_path, job_description)
     return {"file_id": str(db_file.inserted_id)}
@@ -1,9 +1,16 @@
 import os
 import aiofiles
+from fastapi import UploadFile
 
+# 1 MB chunks keep each write syscall bounded without starving the event loop
+WRITE_CHUNK_SIZE = 1024 * 1024
 
-async def save_to_disc(file: bytes, path: str) -> bool:
+
+async def save_to_disc(file: UploadFile, path: str) -> bool:
     os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Stream straight from the upload to disk so large files never sit
+    # fully in memory; peak usage stays at one chunk per request
     async with aiofiles.open(path, 'wb') as out_file:
-        await out_file.write(file)
+        while chunk := await file.read(WRITE_CHUNK_SIZE):
+            await out_file.write(chunk)
     return True
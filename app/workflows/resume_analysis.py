@@ -1,9 +1,21 @@
-from typing import TypedDict, Optional, List
-from langgraph.graph import StateGraph, END
+from typing import TypedDict, Optional, List, Annotated
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from langgraph.graph import StateGraph, START, END
 from langchain_openai import ChatOpenAI
+from ..queue.q import redis_connection
+from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
 import os
 import json
 import base64
+import hashlib
+import threading
+
+
+def keep_latest_error(existing: Optional[str], new: Optional[str]) -> Optional[str]:
+    """Reducer so parallel branches can both report errors without conflict"""
+    return new or existing
 
 
 class ResumeAnalysisState(TypedDict):
@@ -12,73 +24,133 @@ class ResumeAnalysisState(TypedDict):
     job_description: str
     enhanced_job_description: Optional[str]
     resume_images: List[str]
+    base64_images: Optional[List[str]]
     match_score: Optional[int]
     improvements: Optional[List[str]]
     weaknesses: Optional[List[str]]
     summary: Optional[str]
-    error: Optional[str]
+    error: Annotated[Optional[str], keep_latest_error]
+
+
+# Multiple of 3 so intermediate chunks encode without padding
+ENCODE_CHUNK_SIZE = 3 * 65536
+
+# Enhanced job descriptions are cached so many resumes screened against
+# the same posting share one enhancement call
+JD_CACHE_PREFIX = "enhanced_jd:"
+JD_CACHE_TTL_SECONDS = 24 * 60 * 60
+
+
+def jd_cache_key(job_description: str) -> str:
+    digest = hashlib.sha256(job_description.encode("utf-8")).hexdigest()
+    return f"{JD_CACHE_PREFIX}{digest}"
 
 
 def encode_image(file_path: str) -> str:
+    # Encode in chunks instead of f.read() to avoid holding the full file
+    # plus its ~1.33x base64 copy in memory at once. readinto reuses one
+    # preallocated buffer across chunks, and the final join allocates the
+    # result exactly once instead of growing a bytearray.
+    read_buffer = bytearray(ENCODE_CHUNK_SIZE)
+    view = memoryview(read_buffer)
+    encoded_chunks = []
     with open(file_path, 'rb') as f:
-        return base64.b64encode(f.read()).decode("utf-8")
+        while n := f.readinto(read_buffer):
+            encoded_chunks.append(base64.b64encode(view[:n]))
+    return b"".join(encoded_chunks).decode("ascii")
+
 
+# Caps in-flight OpenAI requests per worker process so parallel graph
+# branches (and future fan-out) cannot stampede the rate limit
+openai_semaphore = threading.BoundedSemaphore(
+    int(os.getenv("OPENAI_MAX_CONCURRENCY", "4"))
+)
 
-def enhance_job_description_node(state: ResumeAnalysisState) -> ResumeAnalysisState:
+# Only failures that can clear up on their own are worth re-sending the
+# multi-MB vision payload for; auth and invalid-request errors fail fast
+TRANSIENT_OPENAI_ERRORS = (
+    RateLimitError,
+    APIConnectionError,
+    APITimeoutError,
+    InternalServerError
+)
+
+
+@retry(retry=retry_if_exception_type(TRANSIENT_OPENAI_ERRORS),
+       stop=stop_after_attempt(4), wait=wait_exponential(multiplier=1, min=1, max=30), reraise=True)
+def invoke_llm(llm, messages):
+    """Invoke an LLM under the concurrency cap, retrying transient failures
+    with exponential backoff"""
+    with openai_semaphore:
+        return llm.invoke(messages)
+
+
+@lru_cache(maxsize=None)
+def get_llm(model: str) -> ChatOpenAI:
     """
-    Node 1: Enhance and structure the job description using OpenAI
+    Cached ChatOpenAI client per model, so repeated workflow runs reuse
+    the same underlying HTTP connection pool instead of rebuilding a
+    client (and re-doing TLS handshakes) on every node invocation
+    """
+    return ChatOpenAI(
+        model=model,
+        api_key=os.getenv("OPENAI_API_KEY"),
+        temperature=0.3
+    )
+
+
+def image_content_part(base64_image: str) -> dict:
+    """Build an OpenAI image_url content part from a base64 JPEG in one concat"""
+    return {
+        "type": "image_url",
+        "image_url": {"url": "data:image/jpeg;base64," + base64_image}
+    }
+
+
+def prepare_images_node(state: ResumeAnalysisState) -> ResumeAnalysisState:
+    """
+    Node 1: Base64-encode the resume page images
     """
     try:
-        llm = ChatOpenAI(
-            model="gpt-4o-mini",
-            api_key=os.getenv("OPENAI_API_KEY"),
-            temperature=0.3
-        )
-        
-        system_prompt = """You are an expert recruiter and talent acquisition specialist. 
-Your task is to enhance and structure job descriptions to make them comprehensive and well-organized.
-
-When given a job description, you should:
-1. Clearly identify and organize key requirements
-2. List required technical skills and qualifications
-3. Highlight important soft skills and competencies
-4. Structure responsibilities in a clear manner
-5. Identify must-have vs nice-to-have qualifications
-6. Make the description comprehensive yet concise
+        # The worker already encodes pages in memory; only encode here if
+        # a caller passed image paths instead
+        if state.get("base64_images"):
+            return {}
 
-Return the enhanced job description in a well-structured format."""
+        # Base64 encoding releases the GIL, so threads bring this stage
+        # down to roughly single-page latency
+        with ThreadPoolExecutor(max_workers=max(1, min(8, len(state['resume_images'])))) as executor:
+            base64_images = list(executor.map(encode_image, state['resume_images']))
 
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": f"Please enhance and structure this job description:\n\n{state['job_description']}"}
-        ]
-        
-        response = llm.invoke(messages)
-        enhanced_jd = response.content
-        
-        return {
-            **state,
-            "enhanced_job_description": enhanced_jd
-        }
+        return {"base64_images": base64_images}
     except Exception as e:
-        return {
-            **state,
-            "error": f"Error enhancing job description: {str(e)}"
-        }
+        return {"error": f"Error preparing resume images: {str(e)}"}
 
 
 def analyze_resume_match_node(state: ResumeAnalysisState) -> ResumeAnalysisState:
     """
-    Node 2: Analyze resume against enhanced job description using OpenAI Vision API
+    Node 2: Enhance the job description and analyze the resume against it
+    in a single OpenAI Vision call. A cached enhancement for the same
+    posting skips the enhancement half of the prompt.
     """
     try:
-        llm = ChatOpenAI(
-            model="gpt-4o",
-            api_key=os.getenv("OPENAI_API_KEY"),
-            temperature=0.3
-        )
-        
-        system_prompt = """You are an expert resume reviewer and career advisor.
+        # Reuse a cached enhancement when the same posting was already
+        # processed; a cache outage just falls through to the merged prompt
+        cache_key = jd_cache_key(state['job_description'])
+        enhanced_jd = None
+        try:
+            cached = redis_connection.get(cache_key)
+            if cached:
+                enhanced_jd = cached.decode("utf-8")
+        except Exception:
+            pass
+
+        # JSON mode constrains the model to emit valid JSON, so the
+        # parse-failure fallback below is effectively dead weight
+        llm = get_llm("gpt-4o").bind(response_format={"type": "json_object"})
+
+        if enhanced_jd:
+            system_prompt = """You are an expert resume reviewer and career advisor.
 Your task is to analyze a resume against a job description and provide comprehensive feedback.
 
 You must provide your analysis in the following JSON format:
@@ -96,37 +168,64 @@ Be specific, constructive, and actionable in your feedback. Focus on:
 4. Overall suitability for the position
 
 Return ONLY the JSON object, no additional text."""
+            user_text = f"Job Description:\n{enhanced_jd}\n\nPlease analyze the resume images below against this job description."
+        else:
+            system_prompt = """You are an expert recruiter, resume reviewer and career advisor.
+Your task is to first enhance and structure a raw job description, then analyze a resume against it, all in one response.
+
+When enhancing the job description, you should:
+1. Clearly identify and organize key requirements
+2. List required technical skills and qualifications
+3. Highlight important soft skills and competencies
+4. Structure responsibilities in a clear manner
+5. Identify must-have vs nice-to-have qualifications
+6. Make the description comprehensive yet concise
+
+You must provide your response in the following JSON format:
+{
+    "enhanced_job_description": "<the enhanced and structured job description>",
+    "match_score": <integer between 0-100>,
+    "improvements": [<list of specific improvements the candidate should make>],
+    "weaknesses": [<list of gaps or weaknesses compared to the job requirements>],
+    "summary": "<overall narrative assessment of the candidate's fit for the role>"
+}
+
+Be specific, constructive, and actionable in your feedback. Focus on:
+1. How well the candidate's experience matches the job requirements
+2. Missing qualifications or skills
+3. Areas where the resume could be strengthened
+4. Overall suitability for the position
+
+Return ONLY the JSON object, no additional text."""
+            user_text = f"Job Description:\n{state['job_description']}\n\nPlease enhance this job description, then analyze the resume images below against the enhanced version."
+
+        base64_images = state["base64_images"] or []
+
+        # Build content with all resume page images
+        content = [{"type": "text", "text": user_text}]
+        content.extend(image_content_part(base64_image) for base64_image in base64_images)
 
-        # Encode resume images
-        base64_images = [encode_image(img) for img in state['resume_images']]
-        
-        # Build content with images
-        content = [
-            {"type": "text", "text": f"Job Description:\n{state['enhanced_job_description']}\n\nPlease analyze the resume images below against this job description."}
-        ]
-        
-        # Add all resume page images
-        for base64_image in base64_images:
-            content.append({
-                "type": "image_url",
-                "image_url": {
-                    "url": f"data:image/jpeg;base64,{base64_image}"
-                }
-            })
-        
         messages = [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": content}
         ]
-        
-        response = llm.invoke(messages)
-        
+
+        response = invoke_llm(llm, messages)
+
         # Parse the JSON response
         try:
             analysis_result = json.loads(response.content)
-            
+
+            if not enhanced_jd:
+                enhanced_jd = analysis_result.get("enhanced_job_description")
+                if enhanced_jd:
+                    try:
+                        redis_connection.setex(cache_key, JD_CACHE_TTL_SECONDS, enhanced_jd)
+                    except Exception:
+                        pass
+
             return {
-                **state,
+                "enhanced_job_description": enhanced_jd,
                 "match_score": analysis_result.get("match_score"),
                 "improvements": analysis_result.get("improvements", []),
                 "weaknesses": analysis_result.get("weaknesses", []),
@@ -135,19 +234,16 @@ Return ONLY the JSON object, no additional text."""
         except json.JSONDecodeError:
             # If JSON parsing fails, try to extract information from text
             return {
-                **state,
+                "enhanced_job_description": enhanced_jd,
                 "match_score": None,
                 "improvements": [],
                 "weaknesses": [],
                 "summary": response.content,
                 "error": "Could not parse structured response, returning raw text"
             }
-            
+
     except Exception as e:
-        return {
-            **state,
-            "error": f"Error analyzing resume: {str(e)}"
-        }
+        return {"error": f"Error analyzing resume: {str(e)}"}
 
 
 def create_resume_analysis_workflow() -> StateGraph:
@@ -158,12 +254,12 @@ def create_resume_analysis_workflow() -> StateGraph:
     workflow = StateGraph(ResumeAnalysisState)
     
     # Add nodes
-    workflow.add_node("enhance_job_description", enhance_job_description_node)
+    workflow.add_node("prepare_images", prepare_images_node)
     workflow.add_node("analyze_resume_match", analyze_resume_match_node)
-    
-    # Define edges
-    workflow.set_entry_point("enhance_job_description")
-    workflow.add_edge("enhance_job_description", "analyze_resume_match")
+
+    # Define edges; enhancement now happens inside the analysis call
+    workflow.add_edge(START, "prepare_images")
+    workflow.add_edge("prepare_images", "analyze_resume_match")
     workflow.add_edge("analyze_resume_match", END)
     
     # Compile the workflow